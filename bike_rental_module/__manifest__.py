@@ -8,10 +8,14 @@
         Fonctionnalités :
         - Gestion des contrats de location avec workflow complet
         - Tarification flexible (horaire ou journalière)
+        - Règles tarifaires : week-end, saisons, paliers de durée, groupes de clients
         - Calcul automatique des pénalités de retard
+        - Relances automatiques des locations en retard (par niveaux)
         - Vérification de disponibilité des vélos
+        - Réservations temporaires pendant le paiement en ligne
         - Génération de factures Odoo
         - Rapports statistiques (taux d'occupation, revenus)
+        - Analyse d'utilisation horaire (heatmap jour × heure, pics, vélos inactifs)
         - Vue calendrier pour visualiser la disponibilité
         - Tâche automatique pour mettre à jour les états
     """,
@@ -24,7 +28,11 @@
         'sale',      # Module de vente
         'website',   # Interface web
         'account',   # Module comptable pour la facturation
+        'mail',      # Envoi des relances de retard (mail.mail)
     ],
+    'external_dependencies': {
+        'python': ['numpy'],   # Calcul vectorisé de la matrice d'occupation
+    },
     'data': [
         # Sécurité : définition des droits d'accès aux modèles
         'security/ir.model.access.csv',
@@ -32,8 +40,11 @@
         # Vues : interfaces utilisateur
         'views/product_views.xml',           # Extension des vues produit
         'views/rental_contract_views.xml',   # Vues principales des contrats
+        'views/rental_hold_views.xml',       # Réservations temporaires
+        'views/rental_pricing_rule_views.xml',  # Règles de tarification
         'views/rental_report_views.xml',     # Vues des rapports
         'views/bike_occupation_views.xml',   # Vue du taux d'occupation
+        'views/bike_utilization_views.xml',  # Analyse d'utilisation horaire
 
         # Rapports PDF
         'reports/rental_contract_report.xml',   # Template PDF des contrats (doit être avant views)
@@ -3,12 +3,22 @@ Initialisation des modèles du module Bike Rental.
 
 Ordre d'import :
 1. product_template : Extension du modèle produit (doit être chargé en premier)
-2. rental_contract : Modèle principal des contrats de location
-3. rental_report : Modèles de reporting (vues SQL)
+2. rental_pricing_rule : Règles de tarification (week-end, saison, paliers, groupes)
+3. rental_contract : Modèle principal des contrats de location
+4. rental_overdue_watermark : Curseurs de la tâche de relance des retards
+5. rental_hold : Réservations temporaires pour le paiement en ligne
+6. rental_bike_slot : Créneaux d'occupation des vélos (contrainte d'exclusion)
+7. rental_report : Modèles de reporting (vues SQL)
+8. bike_utilization : Analyse d'utilisation horaire (matrice NumPy)
 
 Chaque import charge un fichier Python contenant un ou plusieurs modèles Odoo.
 """
 
 from . import product_template
+from . import rental_pricing_rule
 from . import rental_contract
+from . import rental_overdue_watermark
+from . import rental_hold
+from . import rental_bike_slot
 from . import rental_report
+from . import bike_utilization
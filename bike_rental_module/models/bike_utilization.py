@@ -0,0 +1,344 @@
+"""
+Analyse d'utilisation horaire de la flotte de vélos.
+
+Les vues SQL de rental_report.py ne donnent que des totaux par vélo.
+Ce module construit une matrice d'occupation vélo × heure avec NumPy
+à partir d'une seule requête sur les contrats, puis en dérive :
+- une heatmap jour de la semaine × heure
+- le pic de concurrence (nombre maximal de vélos loués en même temps)
+- la liste des vélos jamais loués sur la période
+- des percentiles du taux d'utilisation par vélo
+
+Le remplissage de la matrice est vectorisé (tableau de différences +
+somme cumulée) : aucun parcours des contrats créneau par créneau.
+"""
+
+from datetime import datetime, time, timedelta
+
+import numpy as np
+import pytz
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+# Longueur d'un créneau de la matrice (en secondes)
+SLOT_SECONDS = 3600
+
+WEEKDAYS = [
+    ('0', 'Lundi'),
+    ('1', 'Mardi'),
+    ('2', 'Mercredi'),
+    ('3', 'Jeudi'),
+    ('4', 'Vendredi'),
+    ('5', 'Samedi'),
+    ('6', 'Dimanche'),
+]
+
+
+class BikeUtilizationAnalysis(models.AbstractModel):
+    """
+    Service de calcul de la matrice d'occupation vélo × heure.
+
+    Modèle abstrait (pas de table) : il ne fait que charger les contrats
+    et effectuer les calculs NumPy. Les résultats sont exposés par le
+    modèle transitoire bike.utilization.report.
+    """
+    _name = 'bike.utilization.analysis'
+    _description = "Service d'analyse d'utilisation des vélos"
+
+    @api.model
+    def _load_intervals(self, date_from, date_to):
+        """
+        Charge en une seule requête les périodes de location qui
+        chevauchent [date_from, date_to[.
+
+        Seuls les contrats confirmés, en cours ou terminés sont pris en
+        compte. Pour un contrat terminé, la date réelle de retour remplace
+        la date de fin prévue.
+
+        Returns:
+            numpy.ndarray: tableau (n, 3) de (bike_id, début, fin) où les
+            dates sont exprimées en secondes depuis l'époque (UTC).
+        """
+        self.env['rental.contract'].flush_model(
+            ['bike_id', 'start_date', 'end_date', 'actual_return_date', 'state']
+        )
+        self.env.cr.execute("""
+            SELECT rc.bike_id,
+                   EXTRACT(EPOCH FROM rc.start_date),
+                   EXTRACT(EPOCH FROM COALESCE(rc.actual_return_date, rc.end_date))
+              FROM rental_contract rc
+             WHERE rc.state IN ('confirmed', 'ongoing', 'done')
+               AND rc.start_date < %s
+               AND COALESCE(rc.actual_return_date, rc.end_date) > %s
+        """, (date_to, date_from))
+        rows = self.env.cr.fetchall()
+        if not rows:
+            return np.empty((0, 3), dtype=np.float64)
+        return np.array(rows, dtype=np.float64)
+
+    @api.model
+    def _build_occupancy_matrix(self, intervals, bike_ids, date_from, n_slots):
+        """
+        Construit la matrice booléenne d'occupation (vélos × créneaux).
+
+        Chaque location est « peinte » de façon vectorisée : on ajoute +1
+        au créneau de début et -1 au créneau de fin dans un tableau de
+        différences, puis une somme cumulée par ligne donne le nombre de
+        locations actives dans chaque créneau.
+
+        Args:
+            intervals: tableau (n, 3) renvoyé par _load_intervals
+            bike_ids: tableau trié des identifiants de vélos (lignes)
+            date_from: début de la période (datetime UTC naïf)
+            n_slots: nombre de créneaux horaires
+
+        Returns:
+            numpy.ndarray: matrice booléenne de forme (len(bike_ids), n_slots)
+        """
+        n_bikes = len(bike_ids)
+        diff = np.zeros((n_bikes, n_slots + 1), dtype=np.int16)
+        if not len(intervals) or not n_bikes:
+            return diff[:, :n_slots] > 0
+
+        origin = (date_from - datetime(1970, 1, 1)).total_seconds()
+        rows = np.searchsorted(bike_ids, intervals[:, 0].astype(np.int64))
+        # Les contrats dont le vélo n'est plus dans la flotte sont ignorés
+        known = (rows < n_bikes) & (bike_ids[np.minimum(rows, n_bikes - 1)] == intervals[:, 0])
+        rows = rows[known]
+        starts = np.floor((intervals[known, 1] - origin) / SLOT_SECONDS)
+        ends = np.ceil((intervals[known, 2] - origin) / SLOT_SECONDS)
+        starts = np.clip(starts, 0, n_slots).astype(np.intp)
+        ends = np.clip(ends, 0, n_slots).astype(np.intp)
+
+        np.add.at(diff, (rows, starts), 1)
+        np.add.at(diff, (rows, ends), -1)
+        return np.cumsum(diff, axis=1, dtype=np.int16)[:, :n_slots] > 0
+
+    @api.model
+    def _slot_weekday_hour(self, date_from, n_slots, tz_name):
+        """
+        Renvoie pour chaque créneau l'indice jour × heure (0..167) dans
+        le fuseau horaire de l'utilisateur, en tenant compte des
+        changements d'heure.
+        """
+        tz = pytz.timezone(tz_name or 'UTC')
+        start = pytz.utc.localize(date_from)
+        keys = np.empty(n_slots, dtype=np.intp)
+        for i in range(n_slots):
+            local = (start + timedelta(seconds=i * SLOT_SECONDS)).astimezone(tz)
+            keys[i] = local.weekday() * 24 + local.hour
+        return keys
+
+    @api.model
+    def _compute_utilization(self, date_from, date_to, bikes=None):
+        """
+        Calcule l'ensemble des indicateurs d'utilisation sur une période.
+
+        Args:
+            date_from: début de la période (datetime UTC)
+            date_to: fin de la période (datetime UTC, exclue)
+            bikes: vélos à analyser (par défaut tous les vélos de la
+                catégorie "Velos")
+
+        Returns:
+            dict: indicateurs calculés :
+                - bike_ids : identifiants des vélos analysés
+                - heatmap : tableau (7, 24) du taux d'occupation moyen (%)
+                - peak_concurrency : nombre maximal de vélos loués en même temps
+                - peak_date : début du créneau où ce pic est atteint
+                - idle_bike_ids : vélos jamais loués sur la période
+                - utilization : taux d'utilisation (%) par vélo
+                - percentiles : dict {50, 75, 90, 95} du taux d'utilisation
+        """
+        if date_to <= date_from:
+            raise UserError("La date de fin doit être après la date de début.")
+
+        if bikes is None:
+            bikes = self.env['product.template'].search([('categ_id.name', '=', 'Velos')])
+        bike_ids = np.array(sorted(bikes.ids), dtype=np.int64)
+        n_slots = int(np.ceil((date_to - date_from).total_seconds() / SLOT_SECONDS))
+
+        intervals = self._load_intervals(date_from, date_to)
+        occupied = self._build_occupancy_matrix(intervals, bike_ids, date_from, n_slots)
+
+        # Concurrence : nombre de vélos loués dans chaque créneau
+        concurrency = occupied.sum(axis=0, dtype=np.int64)
+        peak_slot = int(concurrency.argmax()) if n_slots else 0
+        peak_concurrency = int(concurrency[peak_slot]) if n_slots else 0
+
+        # Heatmap jour × heure : moyenne du taux d'occupation de la flotte
+        keys = self._slot_weekday_hour(
+            date_from, n_slots, self.env.context.get('tz') or self.env.user.tz
+        )
+        rate = concurrency / len(bike_ids) * 100.0 if len(bike_ids) else np.zeros(n_slots)
+        totals = np.bincount(keys, weights=rate, minlength=7 * 24)
+        counts = np.bincount(keys, minlength=7 * 24)
+        heatmap = np.divide(
+            totals, counts, out=np.zeros(7 * 24, dtype=np.float64), where=counts > 0
+        ).reshape(7, 24)
+
+        # Utilisation par vélo et vélos inactifs
+        hours_used = occupied.sum(axis=1, dtype=np.int64)
+        utilization = hours_used / n_slots * 100.0 if n_slots else np.zeros(len(bike_ids))
+        idle_bike_ids = bike_ids[hours_used == 0].tolist()
+        if len(bike_ids):
+            values = np.percentile(utilization, [50, 75, 90, 95])
+        else:
+            values = np.zeros(4)
+
+        return {
+            'bike_ids': bike_ids.tolist(),
+            'heatmap': heatmap,
+            'peak_concurrency': peak_concurrency,
+            'peak_date': date_from + timedelta(seconds=peak_slot * SLOT_SECONDS),
+            'idle_bike_ids': idle_bike_ids,
+            'utilization': utilization,
+            'percentiles': dict(zip((50, 75, 90, 95), values.tolist())),
+        }
+
+
+class BikeUtilizationReport(models.TransientModel):
+    """
+    Rapport d'utilisation horaire de la flotte.
+
+    L'utilisateur choisit une période, puis le bouton "Calculer" appelle
+    le service bike.utilization.analysis et stocke les résultats :
+    indicateurs globaux, heatmap jour × heure et utilisation par vélo.
+    """
+    _name = 'bike.utilization.report'
+    _description = "Rapport d'utilisation horaire des vélos"
+
+    date_from = fields.Date(
+        string="Du",
+        required=True,
+        default=lambda self: fields.Date.today() - timedelta(days=365),
+    )
+    date_to = fields.Date(
+        string="Au",
+        required=True,
+        default=fields.Date.today,
+    )
+
+    peak_concurrency = fields.Integer(string="Pic de vélos loués simultanément", readonly=True)
+    peak_date = fields.Datetime(string="Date du pic", readonly=True)
+    utilization_p50 = fields.Float(string="Utilisation médiane (%)", readonly=True)
+    utilization_p75 = fields.Float(string="Utilisation P75 (%)", readonly=True)
+    utilization_p90 = fields.Float(string="Utilisation P90 (%)", readonly=True)
+    utilization_p95 = fields.Float(string="Utilisation P95 (%)", readonly=True)
+    idle_bike_ids = fields.Many2many(
+        'product.template',
+        string="Vélos inactifs",
+        readonly=True,
+        help="Vélos qui n'ont été loués à aucun moment sur la période",
+    )
+
+    heatmap_line_ids = fields.One2many(
+        'bike.utilization.heatmap.line',
+        'report_id',
+        string="Heatmap",
+        readonly=True,
+    )
+    bike_line_ids = fields.One2many(
+        'bike.utilization.bike.line',
+        'report_id',
+        string="Utilisation par vélo",
+        readonly=True,
+    )
+
+    def action_compute(self):
+        """
+        Lance le calcul et remplace les résultats précédents.
+
+        Les dates du formulaire sont des jours : la période analysée va
+        du début de date_from à la fin de date_to, dans le fuseau horaire
+        de l'utilisateur (le même que celui de la heatmap), convertis en UTC.
+        """
+        self.ensure_one()
+        tz = pytz.timezone(self.env.context.get('tz') or self.env.user.tz or 'UTC')
+
+        def to_utc(day):
+            local = tz.localize(datetime.combine(day, time.min))
+            return local.astimezone(pytz.utc).replace(tzinfo=None)
+
+        date_from = to_utc(self.date_from)
+        date_to = to_utc(self.date_to + timedelta(days=1))
+        result = self.env['bike.utilization.analysis']._compute_utilization(date_from, date_to)
+
+        heatmap = result['heatmap']
+        percentiles = result['percentiles']
+        self.heatmap_line_ids.unlink()
+        self.bike_line_ids.unlink()
+        self.write({
+            'peak_concurrency': result['peak_concurrency'],
+            'peak_date': result['peak_date'],
+            'utilization_p50': percentiles[50],
+            'utilization_p75': percentiles[75],
+            'utilization_p90': percentiles[90],
+            'utilization_p95': percentiles[95],
+            'idle_bike_ids': [(6, 0, result['idle_bike_ids'])],
+        })
+        self.env['bike.utilization.heatmap.line'].create([
+            {
+                'report_id': self.id,
+                'weekday': str(day),
+                'hour': hour,
+                'occupation_rate': float(heatmap[day, hour]),
+            }
+            for day in range(7)
+            for hour in range(24)
+        ])
+        self.env['bike.utilization.bike.line'].create([
+            {
+                'report_id': self.id,
+                'bike_id': bike_id,
+                'utilization': float(rate),
+            }
+            for bike_id, rate in zip(result['bike_ids'], result['utilization'])
+        ])
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
+
+    def action_open_heatmap(self):
+        """Ouvre la heatmap jour × heure dans une vue pivot."""
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': "Heatmap d'occupation",
+            'res_model': 'bike.utilization.heatmap.line',
+            'view_mode': 'pivot,list',
+            'domain': [('report_id', '=', self.id)],
+            'target': 'current',
+        }
+
+
+class BikeUtilizationHeatmapLine(models.TransientModel):
+    """Cellule de la heatmap : taux d'occupation moyen d'un jour × heure."""
+    _name = 'bike.utilization.heatmap.line'
+    _description = "Cellule de heatmap d'utilisation"
+    _order = 'weekday, hour'
+
+    report_id = fields.Many2one('bike.utilization.report', required=True, ondelete='cascade')
+    weekday = fields.Selection(WEEKDAYS, string="Jour", required=True)
+    hour = fields.Integer(string="Heure", required=True)
+    occupation_rate = fields.Float(
+        string="Taux d'occupation (%)",
+        aggregator='avg',
+        digits=(16, 1),
+    )
+
+
+class BikeUtilizationBikeLine(models.TransientModel):
+    """Taux d'utilisation d'un vélo sur la période analysée."""
+    _name = 'bike.utilization.bike.line'
+    _description = "Utilisation d'un vélo"
+    _order = 'utilization desc'
+
+    report_id = fields.Many2one('bike.utilization.report', required=True, ondelete='cascade')
+    bike_id = fields.Many2one('product.template', string="Vélo", required=True, ondelete='cascade')
+    utilization = fields.Float(string="Utilisation (%)", digits=(16, 1), aggregator='avg')
@@ -0,0 +1,141 @@
+"""
+Créneaux d'occupation des vélos.
+
+Chaque contrat confirmé ou en cours, et chaque réservation temporaire
+(rental.hold), occupe un créneau (vélo, période). Une contrainte
+d'exclusion PostgreSQL interdit deux créneaux qui se chevauchent pour le
+même vélo : c'est la base de données qui refuse la double réservation,
+y compris entre deux transactions simultanées, sans verrou applicatif.
+"""
+
+import psycopg2
+
+from odoo import models, fields, api
+from odoo.exceptions import ValidationError
+from odoo.tools import SQL
+
+# Nom de la contrainte d'exclusion posée par init()
+SLOT_EXCLUSION_CONSTRAINT = 'rental_bike_slot_no_overlap'
+
+
+class RentalBikeSlot(models.Model):
+    """
+    Créneau (vélo, période) occupé par un contrat ou une réservation temporaire.
+
+    Enregistrement technique, géré par rental.contract et rental.hold :
+    - créé à la confirmation d'un contrat ou à la prise d'une réservation
+    - transféré de la réservation au contrat lors de la conversion
+    - supprimé quand le contrat est terminé, annulé ou remis en brouillon,
+      ou avec son contrat / sa réservation (ondelete cascade)
+
+    Le créneau d'une réservation expirée ne bloque plus le vélo : il est
+    supprimé avant toute nouvelle réservation qui le chevauche.
+    """
+    _name = 'rental.bike.slot'
+    _description = "Créneau d'occupation d'un vélo"
+    _order = 'start_date'
+
+    bike_id = fields.Many2one(
+        'product.template',
+        string="Vélo",
+        required=True,
+        index=True,
+        ondelete='cascade',
+    )
+    start_date = fields.Datetime(string="Date début", required=True)
+    end_date = fields.Datetime(string="Date fin", required=True)
+    contract_id = fields.Many2one(
+        'rental.contract',
+        string="Contrat",
+        index=True,
+        ondelete='cascade',
+    )
+    hold_id = fields.Many2one(
+        'rental.hold',
+        string="Réservation temporaire",
+        index=True,
+        ondelete='cascade',
+    )
+    expires_at = fields.Datetime(
+        string="Expire le",
+        help="Expiration de la réservation temporaire (vide pour un contrat)",
+    )
+
+    def init(self):
+        """
+        Pose la contrainte d'exclusion : deux créneaux du même vélo ne
+        peuvent pas se chevaucher (intervalles [début, fin[, deux locations
+        bout à bout restent donc possibles). Le vélo est comparé sous forme
+        d'intervalle d'un seul entier (int4range) : l'index GiST est ainsi
+        disponible sans l'extension btree_gist.
+
+        Les contrats déjà confirmés ou en cours reçoivent ensuite leur
+        créneau. Un éventuel chevauchement hérité d'avant la contrainte est
+        ignoré (ON CONFLICT DO NOTHING) plutôt que de bloquer la mise à jour.
+        """
+        cr = self.env.cr
+        cr.execute(
+            "SELECT 1 FROM pg_constraint WHERE conname = %s", (SLOT_EXCLUSION_CONSTRAINT,)
+        )
+        if not cr.fetchone():
+            cr.execute(SQL(
+                """
+                ALTER TABLE rental_bike_slot ADD CONSTRAINT %s
+                EXCLUDE USING gist (
+                    int4range(bike_id, bike_id, '[]') WITH &&,
+                    tsrange(start_date, end_date) WITH &&
+                )
+                """,
+                SQL.identifier(SLOT_EXCLUSION_CONSTRAINT),
+            ))
+        cr.execute("""
+            INSERT INTO rental_bike_slot (bike_id, start_date, end_date, contract_id,
+                                          create_date, write_date)
+            SELECT rc.bike_id, rc.start_date, rc.end_date, rc.id,
+                   now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+              FROM rental_contract rc
+             WHERE rc.state IN ('confirmed', 'ongoing')
+               AND rc.start_date < rc.end_date
+               AND NOT EXISTS (
+                   SELECT 1 FROM rental_bike_slot s WHERE s.contract_id = rc.id
+               )
+            ON CONFLICT DO NOTHING
+        """)
+
+    @api.model
+    def _book(self, vals):
+        """
+        Crée un créneau, ou lève aussitôt une ValidationError si le vélo est
+        déjà occupé sur la période.
+
+        Les créneaux de réservations expirées qui chevauchent la période
+        sont d'abord supprimés. L'insertion se fait dans un point de
+        sauvegarde : en cas de chevauchement, seule elle est annulée. Face
+        à une réservation concurrente pas encore validée, PostgreSQL attend
+        seulement la fin de l'autre transaction pour trancher : la requête
+        n'est jamais rejouée.
+
+        Args:
+            vals: bike_id, start_date, end_date et contract_id ou hold_id
+                (avec expires_at)
+
+        Returns:
+            rental.bike.slot: le créneau créé
+
+        Raises:
+            ValidationError: si le vélo est déjà loué sur cette période
+        """
+        self.search([
+            ('bike_id', '=', vals['bike_id']),
+            ('expires_at', '<=', fields.Datetime.now()),
+            ('start_date', '<', vals['end_date']),
+            ('end_date', '>', vals['start_date']),
+        ]).unlink()
+        try:
+            with self.env.cr.savepoint():
+                return self.create(vals)
+        except psycopg2.errors.ExclusionViolation:
+            bike = self.env['product.template'].browse(vals['bike_id'])
+            raise ValidationError(
+                f"Le vélo {bike.display_name} est déjà loué sur cette période."
+            ) from None
@@ -9,8 +9,26 @@ Ce module permet de créer et gérer des contrats de location avec :
 - Workflow complet de location (brouillon -> confirmé -> en cours -> terminé)
 """
 
+from datetime import timedelta
+
+from markupsafe import Markup
+
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError, UserError
+from odoo.tools import SQL
+
+# Niveaux de relance des locations en retard : (niveau, délai après la date de fin)
+OVERDUE_LEVELS = [
+    (1, timedelta(hours=1)),
+    (2, timedelta(hours=24)),
+]
+
+# Au premier passage (pas encore de curseur), on ne remonte pas plus loin
+OVERDUE_INITIAL_LOOKBACK = timedelta(days=1)
+
+# Nombre maximal d'événements renvoyés par vélo et par fenêtre du calendrier
+CALENDAR_EVENTS_PER_BIKE = 20
+
 
 class RentalContract(models.Model):
     """
@@ -49,8 +67,8 @@ class RentalContract(models.Model):
         required=True
     )
 
-    start_date = fields.Datetime(string="Date début", required=True)
-    end_date = fields.Datetime(string="Date fin", required=True)
+    start_date = fields.Datetime(string="Date début", required=True, index=True)
+    end_date = fields.Datetime(string="Date fin", required=True, index=True)
 
     notes = fields.Text("Notes")
 
@@ -113,7 +131,7 @@ class RentalContract(models.Model):
         string="Pénalités de retard",
         compute="_compute_late_penalty",
         store=True,
-        help="Pénalités = prix location horaire × heures de retard"
+        help="Pénalités = prix horaire × heures de retard, ou règles tarifaires de pénalité"
     )
 
     total_amount = fields.Float(
@@ -143,6 +161,24 @@ class RentalContract(models.Model):
         default='draft'
     )
 
+    overdue_level = fields.Integer(
+        string="Niveau de relance",
+        default=0,
+        readonly=True,
+        copy=False,
+        help="Dernier niveau de relance de retard envoyé au client (0 = aucune relance)"
+    )
+
+    overdue_pending = fields.Boolean(
+        string="Relance à rattraper",
+        index=True,
+        readonly=True,
+        copy=False,
+        help="Contrat passé en cours ou dont la date de fin a été modifiée alors que "
+             "cette date est déjà dépassée : la prochaine tâche de relance le traitera "
+             "même si son curseur a déjà dépassé cette date de fin."
+    )
+
 
     # ====================================
     # CALCUL DES RETARDS ET PENALITES
@@ -245,50 +281,61 @@ class RentalContract(models.Model):
     # =========================
     #   PRIX TOTAL
     # =========================
-    @api.depends('unit_price', 'duration_hours', 'duration_days', 'billing_unit')
+    @api.depends('unit_price', 'duration_hours', 'duration_days', 'billing_unit',
+                 'start_date', 'customer_id')
     def _compute_total_price(self):
+        """
+        Prix de location = somme des prix de chaque unité (heure ou jour),
+        selon les règles de tarification (rental.pricing.rule).
+        Sans règle applicable : prix unitaire × durée.
+        """
+        prices = self.env['rental.pricing.rule']._compute_rental_prices(self)
         for rec in self:
-            if rec.billing_unit == 'hour':
-                rec.price = rec.unit_price * rec.duration_hours
-            else:
-                rec.price = rec.unit_price * rec.duration_days
+            rec.price = prices[rec.id]
 
     # =========================
     #   DISPONIBILITÉ DU VÉLO
     # =========================
     def _check_bike_availability(self):
         """
-        Vérifie la disponibilité du vélo pour la période demandée.
+        Réserve le créneau du vélo pour la période du contrat (rental.bike.slot).
 
-        Cette méthode empêche la double réservation en vérifiant qu'aucun autre
-        contrat confirmé ou en cours n'existe pour le même vélo sur une période
-        qui chevauche la période demandée.
+        La double réservation est refusée par la base de données : une
+        contrainte d'exclusion interdit deux créneaux qui se chevauchent
+        pour le même vélo, qu'ils appartiennent à un contrat confirmé ou en
+        cours ou à une réservation temporaire active (rental.hold). Deux
+        confirmations simultanées ne peuvent donc pas passer toutes les
+        deux : la seconde échoue aussitôt.
 
         Algorithme de détection de chevauchement :
         - Un chevauchement existe si :
           (start_date_existant < end_date_nouveau) ET (end_date_existant > start_date_nouveau)
 
-        Seuls les contrats confirmés et en cours sont vérifiés.
-        Les brouillons et annulés n'affectent pas la disponibilité.
+        Les brouillons et annulés n'occupent pas de créneau. Un contrat qui
+        a déjà son créneau pour la même période (passage en cours) ne le
+        reprend pas ; si le vélo ou la période ont changé, il est remplacé.
 
         Lève une ValidationError si le vélo est déjà réservé sur cette période.
         """
+        slots = self.env['rental.bike.slot'].sudo()
         for rec in self:
             if not (rec.bike_id and rec.start_date and rec.end_date):
                 continue
 
-            domain = [
-                ('id', '!=', rec.id),                 # pas moi-même
-                ('bike_id', '=', rec.bike_id.id),    # même vélo
-                ('state', 'in', ['confirmed', 'ongoing']),
-                ('start_date', '<', rec.end_date),
-                ('end_date', '>', rec.start_date),
-            ]
-            overlapping = self.search_count(domain)
-            if overlapping:
-                raise ValidationError(
-                    f"Le vélo {rec.bike_id.display_name} est déjà loué sur cette période."
-                )
+            current = slots.search([('contract_id', '=', rec.id)])
+            if len(current) == 1 and (
+                current.bike_id == rec.bike_id
+                and current.start_date == rec.start_date
+                and current.end_date == rec.end_date
+            ):
+                continue
+            current.unlink()
+            slots._book({
+                'bike_id': rec.bike_id.id,
+                'start_date': rec.start_date,
+                'end_date': rec.end_date,
+                'contract_id': rec.id,
+            })
 
     @api.model
     def cron_update_contract_states(self):
@@ -298,18 +345,20 @@ class RentalContract(models.Model):
         Cette méthode est exécutée périodiquement (toutes les heures par défaut)
         via une tâche cron Odoo.
 
-        Actions automatiques :
-        1. Passe les contrats "Confirmés" à "En cours" quand la date de début est atteinte
-        2. Passe les contrats "En cours" à "Terminé" quand la date de fin est dépassée
+        Action automatique :
+        - Passe les contrats "Confirmés" à "En cours" quand la date de début est atteinte
 
-        Cela évite aux utilisateurs d'avoir à changer manuellement les états
-        et assure une transition fluide du workflow.
+        Les contrats "En cours" ne sont pas terminés automatiquement : le
+        passage à "Terminé" correspond au retour réel du vélo (action_done,
+        qui enregistre actual_return_date). Un contrat dont la date de fin est
+        dépassée reste donc "En cours", en retard, et fait l'objet de relances
+        (cron_send_overdue_reminders).
 
         Note : Les dates sont comparées avec l'heure actuelle du serveur.
         """
         now = fields.Datetime.now()
 
-        # 1. Passer en 'ongoing' les contrats confirmés dont la date de début est passée
+        # Passer en 'ongoing' les contrats confirmés dont la date de début est passée
         to_start = self.search([
             ('state', '=', 'confirmed'),
             ('start_date', '<=', now),
@@ -317,14 +366,285 @@ class RentalContract(models.Model):
         if to_start:
             to_start.action_start()
 
-        # 2. (optionnel) Terminer automatiquement les contrats en cours dont la fin est passée
-        to_done = self.search([
+    @api.model
+    def cron_send_overdue_reminders(self):
+        """
+        Tâche planifiée d'envoi des relances pour les locations en retard.
+
+        Seuls les contrats réellement non rendus sont concernés : "En cours"
+        et sans date réelle de retour.
+
+        Les champs de retard stockés (is_late, late_hours et la pénalité)
+        ne dépendent pas que des champs du contrat mais aussi de l'heure :
+        ils sont d'abord recalculés pour les contrats en cours dont la date
+        de fin est dépassée (voir _refresh_late_fields).
+
+        Pour chaque niveau de relance (OVERDUE_LEVELS), un curseur
+        (watermark, rental.overdue.watermark) mémorise la dernière date de
+        fin déjà traitée. Chaque passage ne traite que les contrats dont la
+        date de fin est comprise entre ce curseur et (maintenant - délai du
+        niveau), via une requête sur end_date (indexé) : le coût ne dépend
+        pas de la taille de l'historique.
+
+        Un contrat peut devenir en retard derrière le curseur : passage en
+        cours tardif (action_start manuelle, tâche planifiée interrompue) ou
+        date de fin réécrite dans le passé. write() le marque alors
+        overdue_pending (indexé) et il est repris au passage suivant, puis
+        le marqueur est effacé. Seule exception assumée : au tout premier
+        passage, les retards antérieurs à OVERDUE_INITIAL_LOOKBACK ne sont
+        pas relancés.
+
+        Les niveaux sont traités du plus élevé au plus bas, et le champ
+        overdue_level empêche tout doublon : un contrat n'est relancé
+        qu'une fois par niveau, et ne reçoit que la relance la plus élevée
+        qui le concerne lors d'un même passage. Les mails sont créés en une
+        seule fois par niveau et envoyés par la file d'attente standard de
+        mail.mail.
+        """
+        now = fields.Datetime.now()
+        self._refresh_late_fields(now)
+        watermarks = self.env['rental.overdue.watermark'].sudo()
+        pending = self.search([('overdue_pending', '=', True)])
+        unreturned = [('state', '=', 'ongoing'), ('actual_return_date', '=', False)]
+
+        for level, delay in sorted(OVERDUE_LEVELS, reverse=True):
+            threshold = now - delay
+            cursor = watermarks._get_for_level(level, threshold - OVERDUE_INITIAL_LOOKBACK)
+            watermark = cursor.watermark
+
+            contracts = self.browse()
+            if watermark < threshold:
+                contracts = self.search([
+                    ('end_date', '>', watermark),
+                    ('end_date', '<=', threshold),
+                    ('overdue_level', '<', level),
+                ] + unreturned)
+            # Contrats rattrapés : en retard derrière le curseur
+            contracts |= pending.filtered(
+                lambda c: c.state == 'ongoing' and not c.actual_return_date
+                and c.end_date <= threshold and c.overdue_level < level
+            )
+            if contracts:
+                self.env['mail.mail'].sudo().create([
+                    contract._prepare_overdue_mail_values(level)
+                    for contract in contracts
+                    if contract.customer_id.email
+                ])
+                contracts.write({'overdue_level': level})
+            if watermark < threshold:
+                cursor.watermark = threshold
+
+        # Les niveaux non encore atteints le seront via la fenêtre du curseur,
+        # qui est désormais avant la date de fin de ces contrats
+        if pending:
+            pending.write({'overdue_pending': False})
+
+    def _refresh_late_fields(self, now):
+        """
+        Recalcule les champs de retard stockés des contrats en cours dont la
+        date de fin est dépassée (recherche sur end_date, indexé).
+
+        Ces champs dépendent de l'heure courante : sans ce recalcul
+        périodique, is_late, late_hours et la pénalité d'un contrat non
+        rendu resteraient figés à leur dernière valeur calculée.
+        """
+        overdue = self.search([
             ('state', '=', 'ongoing'),
             ('end_date', '<=', now),
         ])
-        if to_done:
-            to_done.action_done()
+        if not overdue:
+            return
+        fnames = ['is_late', 'late_hours', 'late_penalty', 'total_amount']
+        for fname in fnames:
+            self.env.add_to_compute(self._fields[fname], overdue)
+        overdue.flush_recordset(fnames)
+
+    def _prepare_overdue_mail_values(self, level):
+        """
+        Valeurs du mail.mail de relance de niveau `level` pour ce contrat.
+        L'échéance est affichée dans le fuseau horaire du client (à défaut,
+        celui de la société).
+        """
+        self.ensure_one()
+        tz = self.customer_id.tz or self.env.company.partner_id.tz
+        end_date = fields.Datetime.context_timestamp(self.with_context(tz=tz), self.end_date)
+        if level == 1:
+            subject = f"Votre location {self.name} est arrivée à échéance"
+            intro = "La période de votre location est terminée depuis plus d'une heure."
+        else:
+            subject = f"Rappel : location {self.name} en retard"
+            intro = "Votre location est en retard depuis plus de 24 heures."
+        body = Markup(
+            "<p>Bonjour %s,</p>"
+            "<p>%s Le vélo <strong>%s</strong> devait être rendu le %s.</p>"
+            "<p>Des pénalités de retard s'appliquent à chaque heure supplémentaire. "
+            "Merci de le rapporter au plus vite.</p>"
+        ) % (
+            self.customer_id.name,
+            intro,
+            self.bike_id.display_name,
+            end_date.strftime('%d/%m/%Y %H:%M'),
+        )
+        return {
+            'subject': subject,
+            'body_html': body,
+            'email_from': self.env.company.email_formatted,
+            'email_to': self.customer_id.email_formatted,
+            'auto_delete': True,
+        }
+
+
+    # =========================
+    #   DONNÉES DU CALENDRIER
+    # =========================
+    @api.model
+    def get_calendar_data(self, start, end, bike_ids=None,
+                          limit_per_bike=CALENDAR_EVENTS_PER_BIKE,
+                          prefetch=('previous', 'next')):
+        """
+        Renvoie les événements du calendrier de disponibilité pour une fenêtre.
+
+        Seuls les champs utiles à l'affichage sont lus (vélo, client, dates,
+        statut), en une seule requête SQL qui s'appuie sur les index de
+        start_date / end_date : le coût dépend du contenu de la fenêtre, pas
+        de l'historique. Les contrats sont filtrés par _search, donc selon
+        les règles d'accès (ir.rule) de l'utilisateur. Les événements sont
+        groupés par vélo et limités à `limit_per_bike` côté serveur ; le
+        reste est résumé par un compteur "+N de plus".
+
+        Par défaut, les fenêtres voisines (de même durée) sont préchargées
+        dans la même requête, pour une navigation sans attente vers la
+        période précédente ou suivante. prefetch=() ne renvoie que la
+        fenêtre visible.
+
+        Args:
+            start: début de la fenêtre visible (datetime ou chaîne UTC)
+            end: fin de la fenêtre visible (datetime ou chaîne UTC)
+            bike_ids: liste de vélos à afficher (None = tous les vélos)
+            limit_per_bike: nombre maximal d'événements par vélo et par fenêtre
+            prefetch: fenêtres voisines à précharger, parmi 'previous' et 'next'
 
+        Returns:
+            dict: {clé: fenêtre} pour 'current' et les fenêtres préchargées,
+            où chaque fenêtre vaut {'start', 'end',
+            'bikes': [{'bike_id', 'bike_name', 'events': [...], 'more': N}]}
+        """
+        self.check_access('read')
+        start = fields.Datetime.to_datetime(start)
+        end = fields.Datetime.to_datetime(end)
+        if end <= start:
+            raise UserError("La fin de la fenêtre doit être après son début.")
+        if set(prefetch) - {'previous', 'next'}:
+            raise UserError("Fenêtres à précharger possibles : 'previous' et 'next'.")
+
+        span = end - start
+        windows = [('current', start, end)]
+        if 'previous' in prefetch:
+            windows.insert(0, ('previous', start - span, start))
+        if 'next' in prefetch:
+            windows.append(('next', end, end + span))
+
+        domain = [
+            ('state', 'in', ['confirmed', 'ongoing', 'done']),
+            ('start_date', '<', max(w_end for __, __, w_end in windows)),
+            ('end_date', '>', min(w_start for __, w_start, __ in windows)),
+        ]
+        if bike_ids is not None:
+            domain.append(('bike_id', 'in', list(bike_ids)))
+        query = self._search(domain)
+        self.flush_model(['bike_id', 'customer_id', 'start_date', 'end_date', 'state'])
+
+        values = SQL(", ").join(
+            SQL("(%s, %s::timestamp, %s::timestamp)", key, w_start, w_end)
+            for key, w_start, w_end in windows
+        )
+        self.env.cr.execute(SQL("""
+            WITH windows (key, w_start, w_end) AS (VALUES %s)
+            SELECT key, id, bike_id, customer_id, start_date, end_date, state, total
+              FROM (
+                    SELECT w.key, rc.id, rc.bike_id, rc.customer_id,
+                           rc.start_date, rc.end_date, rc.state,
+                           ROW_NUMBER() OVER (
+                               PARTITION BY w.key, rc.bike_id ORDER BY rc.start_date, rc.id
+                           ) AS rank,
+                           COUNT(*) OVER (PARTITION BY w.key, rc.bike_id) AS total
+                      FROM windows w
+                      JOIN rental_contract rc
+                        ON rc.start_date < w.w_end
+                       AND rc.end_date > w.w_start
+                     WHERE rc.id IN %s
+                   ) events
+             WHERE rank <= %s
+             ORDER BY key, bike_id, start_date, id
+        """, values, query.subselect(), limit_per_bike))
+        rows = self.env.cr.fetchall()
+
+        # Noms des vélos et clients : une lecture groupée par modèle
+        bikes = self.env['product.template'].browse({row[2] for row in rows})
+        customers = self.env['res.partner'].browse({row[3] for row in rows})
+        bike_names = {bike.id: bike.display_name for bike in bikes}
+        customer_names = {customer.id: customer.display_name for customer in customers}
+
+        result = {
+            key: {
+                'start': fields.Datetime.to_string(w_start),
+                'end': fields.Datetime.to_string(w_end),
+                'bikes': [],
+            }
+            for key, w_start, w_end in windows
+        }
+        groups = {}
+        for key, contract_id, bike_id, customer_id, start_date, end_date, state, total in rows:
+            group = groups.get((key, bike_id))
+            if group is None:
+                group = groups[(key, bike_id)] = {
+                    'bike_id': bike_id,
+                    'bike_name': bike_names[bike_id],
+                    'events': [],
+                    'more': max(total - limit_per_bike, 0),
+                }
+                result[key]['bikes'].append(group)
+            group['events'].append({
+                'id': contract_id,
+                'customer_id': customer_id,
+                'customer_name': customer_names[customer_id],
+                'start': fields.Datetime.to_string(start_date),
+                'end': fields.Datetime.to_string(end_date),
+                'state': state,
+            })
+        return result
+
+    # =========================
+    #   CRUD
+    # =========================
+    def write(self, vals):
+        """
+        Créneaux des vélos : libérés quand le contrat est terminé, annulé ou
+        remis en brouillon ; déplacés si le vélo ou la période d'un contrat
+        confirmé ou en cours changent.
+
+        Suivi des relances de retard :
+        - une nouvelle date de fin ouvre un nouveau cycle de relances ;
+        - un contrat qui passe en cours, ou dont la date de fin change, alors
+          que cette date est déjà dépassée est marqué overdue_pending pour
+          que la tâche de relance le traite même derrière son curseur.
+        """
+        if 'end_date' in vals and 'overdue_level' not in vals:
+            vals = dict(vals, overdue_level=0)
+        res = super().write(vals)
+        if vals.get('state') in ('draft', 'done', 'cancel'):
+            self.env['rental.bike.slot'].sudo().search([('contract_id', 'in', self.ids)]).unlink()
+        elif {'bike_id', 'start_date', 'end_date'} & set(vals):
+            self.filtered(lambda c: c.state in ('confirmed', 'ongoing'))._check_bike_availability()
+        if 'end_date' in vals or vals.get('state') == 'ongoing':
+            now = fields.Datetime.now()
+            late = self.filtered(
+                lambda c: c.state == 'ongoing' and c.end_date and c.end_date <= now
+                and not c.overdue_pending
+            )
+            if late:
+                super(RentalContract, late).write({'overdue_pending': True})
+        return res
 
     # =========================
     #   ACTIONS / WORKFLOW
@@ -378,6 +698,8 @@ class RentalContract(models.Model):
         Calcul des lignes de facture :
         - Ligne location : quantité = durée (heures ou jours) × prix unitaire
         - Ligne pénalité : quantité = jours de retard × prix pénalité par jour
+        Les prix unitaires sont les prix moyens issus des règles de tarification,
+        pour que la facture corresponde au prix et aux pénalités du contrat.
 
         Returns:
             dict: Action Odoo pour ouvrir la facture créée dans une vue formulaire
@@ -408,12 +730,12 @@ class RentalContract(models.Model):
         # Déterminer la quantité et le prix unitaire selon le mode de facturation
         if self.billing_unit == 'day':
             quantity = self.duration_days
-            unit_price = self.unit_price
             description = f"Location vélo {self.bike_id.name} - {self.duration_days:.2f} jours"
         else:  # hour
             quantity = self.duration_hours
-            unit_price = self.unit_price
             description = f"Location vélo {self.bike_id.name} - {self.duration_hours:.2f} heures"
+        # Prix moyen issu des règles de tarification
+        unit_price = self.price / quantity if quantity else self.unit_price
 
         # Créer la ligne de location
         invoice_line_vals = {
@@ -427,9 +749,8 @@ class RentalContract(models.Model):
         # Ligne 2 : Pénalités de retard (si applicable)
         if self.is_late and self.late_hours > 0:
             # Calculer le prix unitaire de la pénalité par jour
-            hourly_rate = self.unit_price if self.billing_unit == 'hour' else self.unit_price / 24
             late_days = self.late_hours / 24
-            penalty_unit_price = hourly_rate * 24  # Prix par jour de retard
+            penalty_unit_price = self.late_penalty / late_days  # Prix par jour de retard
 
             penalty_line_vals = {
                 'name': f"Pénalité retard - {self.late_hours:.2f} heures ({late_days:.2f} jours)",
@@ -455,14 +776,17 @@ class RentalContract(models.Model):
             'target': 'current',
         }
 
-    @api.depends('late_hours', 'unit_price', 'billing_unit')
+    @api.depends('is_late', 'late_hours', 'unit_price', 'billing_unit', 'end_date',
+                 'customer_id')
     def _compute_late_penalty(self):
+        """
+        Pénalités = heures de retard tarifées avec les règles de tarification
+        de portée "Pénalités de retard" (rental.pricing.rule).
+        Sans règle applicable : prix horaire × heures de retard.
+        """
+        penalties = self.env['rental.pricing.rule']._compute_late_penalties(self)
         for rec in self:
-            rec.late_penalty = 0.0
-            if rec.is_late and rec.late_hours > 0:
-                # Utiliser le prix horaire pour calculer la pénalité
-                hourly_rate = rec.unit_price if rec.billing_unit == 'hour' else rec.unit_price / 24
-                rec.late_penalty = hourly_rate * rec.late_hours
+            rec.late_penalty = penalties.get(rec.id, 0.0)
 
     @api.depends('price', 'late_penalty')
     def _compute_total_amount(self):
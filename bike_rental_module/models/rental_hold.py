@@ -0,0 +1,183 @@
+"""
+Réservations temporaires de vélos pour le paiement en ligne.
+
+Un contrat ne bloque un vélo qu'une fois confirmé : deux clients du site
+peuvent donc arriver au paiement pour le même vélo. Une réservation
+temporaire (rental.hold) bloque le couple (vélo, période) pendant
+quelques minutes, le temps du paiement :
+- elle occupe un créneau du vélo (rental.bike.slot), comme un contrat confirmé
+- elle expire automatiquement (tâche planifiée sur un champ indexé)
+- elle est convertie en contrat confirmé une fois le paiement reçu
+"""
+
+from datetime import timedelta
+
+from odoo import models, fields, api
+from odoo.exceptions import ValidationError, UserError
+
+# Durée de vie par défaut d'une réservation temporaire (en minutes)
+DEFAULT_HOLD_MINUTES = 15
+
+
+class RentalHold(models.Model):
+    """
+    Réservation temporaire d'un vélo sur une période.
+
+    Enregistrement volontairement léger : pas de statut ni de champ
+    calculé. Une réservation est active tant que expires_at est dans le
+    futur ; elle est supprimée à l'expiration ou à la conversion.
+    """
+    _name = 'rental.hold'
+    _description = 'Réservation temporaire de vélo'
+    _order = 'expires_at'
+
+    bike_id = fields.Many2one(
+        'product.template',
+        string="Vélo",
+        required=True,
+        index=True,
+        ondelete='cascade',
+    )
+    customer_id = fields.Many2one(
+        'res.partner',
+        string="Client",
+        ondelete='cascade',
+    )
+    start_date = fields.Datetime(string="Date début", required=True)
+    end_date = fields.Datetime(string="Date fin", required=True)
+    expires_at = fields.Datetime(
+        string="Expire le",
+        required=True,
+        index=True,
+        help="Au-delà de cette date, la réservation ne bloque plus le vélo",
+    )
+
+    @api.model
+    def _get_hold_duration(self):
+        """Durée de vie d'une réservation, configurable par paramètre système."""
+        minutes = self.env['ir.config_parameter'].sudo().get_param(
+            'bike_rental_module.hold_minutes', DEFAULT_HOLD_MINUTES
+        )
+        return timedelta(minutes=int(minutes))
+
+    @api.model
+    def create_hold(self, bike_id, start_date, end_date, customer_id=False):
+        """
+        Réserve temporairement un vélo au début du paiement en ligne.
+
+        Les dates sont validées avec les mêmes règles que le contrat, pour
+        que la conversion ne puisse pas échouer sur ce point après le
+        paiement. Le créneau du vélo est ensuite pris (voir
+        rental.bike.slot._book) : si le vélo est déjà occupé, y compris par
+        une réservation simultanée, l'erreur est immédiate.
+
+        Returns:
+            rental.hold: la réservation créée
+
+        Raises:
+            ValidationError: si les dates sont invalides ou si le vélo n'est
+                pas disponible sur la période
+        """
+        if start_date >= end_date:
+            raise ValidationError(
+                "La date de fin doit être strictement après la date de début."
+            )
+        if start_date < fields.Datetime.now():
+            raise ValidationError(
+                "La date de début ne peut pas être dans le passé."
+            )
+        hold = self.create({
+            'bike_id': bike_id,
+            'customer_id': customer_id,
+            'start_date': start_date,
+            'end_date': end_date,
+            'expires_at': fields.Datetime.now() + self._get_hold_duration(),
+        })
+        self.env['rental.bike.slot'].sudo()._book({
+            'bike_id': bike_id,
+            'start_date': start_date,
+            'end_date': end_date,
+            'hold_id': hold.id,
+            'expires_at': hold.expires_at,
+        })
+        return hold
+
+    def action_convert_to_contract(self, vals=None):
+        """
+        Transforme la réservation en contrat confirmé après le paiement.
+
+        Le vélo et la période sont ceux de la réservation : vals ne peut pas
+        les modifier tant qu'elle existe. Si elle est encore active, son
+        créneau est transféré au contrat, qui est confirmé sans que le vélo
+        soit libéré entre les deux. La réservation est ensuite supprimée
+        dans la même transaction.
+
+        Si la réservation a expiré, voire a déjà été supprimée par la tâche
+        planifiée pendant le paiement, la conversion est tout de même
+        tentée : le contrat reprend un créneau s'il est encore libre. Pour
+        une réservation supprimée, vals doit alors fournir le vélo, le
+        client et la période.
+
+        Args:
+            vals: valeurs complémentaires du contrat (client, mode de
+                facturation, notes...)
+
+        Returns:
+            rental.contract: le contrat confirmé
+
+        Raises:
+            UserError: si vals modifie le vélo ou la période de la
+                réservation, si la réservation n'existe plus et que vals ne
+                permet pas de créer le contrat, ou si aucun client n'est connu
+            ValidationError: si le vélo n'est plus disponible sur la période
+        """
+        self.ensure_one()
+        hold = self.exists()
+        vals = dict(vals or {})
+        contract_vals = {}
+        if hold:
+            booked = {
+                'bike_id': hold.bike_id.id,
+                'start_date': hold.start_date,
+                'end_date': hold.end_date,
+            }
+            if any(
+                key in vals and self._fields[key].convert_to_cache(vals[key], self) != value
+                for key, value in booked.items()
+            ):
+                raise UserError(
+                    "Le vélo et la période d'une réservation temporaire ne peuvent "
+                    "pas être modifiés lors de sa conversion en contrat."
+                )
+            contract_vals = dict(booked, customer_id=hold.customer_id.id)
+        contract_vals.update(vals)
+        if not all(contract_vals.get(key) for key in ('bike_id', 'start_date', 'end_date')):
+            raise UserError(
+                "La réservation temporaire a expiré et n'existe plus : "
+                "impossible de retrouver le vélo et la période à louer."
+            )
+        if not contract_vals.get('customer_id'):
+            raise UserError("Un client est nécessaire pour créer le contrat de location.")
+
+        contract = self.env['rental.contract'].create(contract_vals)
+        if hold and hold.expires_at > fields.Datetime.now():
+            self.env['rental.bike.slot'].sudo().search([('hold_id', '=', hold.id)]).write({
+                'hold_id': False,
+                'contract_id': contract.id,
+                'expires_at': False,
+            })
+        contract.action_confirm()
+        hold.unlink()
+        return contract
+
+    @api.model
+    def cron_expire_holds(self):
+        """
+        Tâche planifiée : supprime les réservations expirées.
+
+        La recherche porte uniquement sur expires_at (indexé) : le coût
+        dépend du nombre de réservations expirées, pas de l'historique.
+        Une réservation expirée mais pas encore supprimée ne bloque déjà
+        plus le vélo : ce nettoyage n'est pas critique.
+        """
+        self.search([('expires_at', '<=', fields.Datetime.now())]).unlink()
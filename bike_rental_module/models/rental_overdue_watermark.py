@@ -0,0 +1,35 @@
+"""
+Curseurs (watermarks) des relances de retard.
+
+Une ligne par niveau de relance mémorise la dernière date de fin déjà
+traitée par la tâche planifiée (voir rental.contract.cron_send_overdue_reminders).
+Une table dédiée plutôt qu'un paramètre système : modifier un paramètre
+système vide les caches de tous les workers, à chaque passage de la tâche.
+"""
+
+from odoo import models, fields, api
+
+
+class RentalOverdueWatermark(models.Model):
+    """Curseur de la tâche de relance pour un niveau de relance."""
+    _name = 'rental.overdue.watermark'
+    _description = 'Curseur des relances de retard'
+    _order = 'level'
+
+    level = fields.Integer(string="Niveau de relance", required=True)
+    watermark = fields.Datetime(
+        string="Curseur",
+        required=True,
+        help="Les contrats dont la date de fin est antérieure ont déjà été traités pour ce niveau",
+    )
+
+    _level_unique = models.Constraint(
+        'UNIQUE(level)',
+        "Un seul curseur par niveau de relance.",
+    )
+
+    @api.model
+    def _get_for_level(self, level, default):
+        """Curseur du niveau `level`, créé à la date `default` au premier passage."""
+        watermark = self.search([('level', '=', level)], limit=1)
+        return watermark or self.create({'level': level, 'watermark': default})
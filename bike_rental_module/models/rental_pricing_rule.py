@@ -0,0 +1,334 @@
+"""
+Règles de tarification des locations.
+
+Les tarifs de base restent les champs rental_price_hour / rental_price_day
+du vélo. Les règles permettent de les moduler :
+- tarifs week-end / semaine
+- tarifs saisonniers (période de dates)
+- paliers de durée (ex. jour 1 plein tarif, jours 2 à 7 remisés)
+- tarifs par groupe de clients (étiquettes de contact)
+- tarifs spécifiques aux pénalités de retard (règles de portée "pénalités")
+
+Les règles actives sont compilées une seule fois en une structure en
+mémoire indexée par (portée, mode de facturation, vélo, catégorie), mise
+en cache et invalidée à chaque modification d'une règle. Le calcul des
+prix se fait ensuite en lot sur des ensembles de contrats, sans aucune
+recherche de règle par contrat ni par jour.
+"""
+
+from collections import namedtuple
+from datetime import timedelta
+
+import pytz
+
+from odoo import models, fields, api, tools
+from odoo.exceptions import ValidationError
+
+# Règle compilée : uniquement des valeurs simples, pour pouvoir être mise en cache
+CompiledRule = namedtuple('CompiledRule', [
+    'partner_category_id', 'day_type', 'date_start', 'date_end',
+    'tier_min', 'tier_max', 'price_type', 'value',
+])
+
+UNIT_DELTAS = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+
+
+class RentalPricingRule(models.Model):
+    """
+    Règle de tarification applicable à une unité de location (heure ou jour).
+
+    Pour chaque unité d'une location, la première règle qui correspond
+    s'applique, dans l'ordre de priorité suivant :
+    1. règles du vélo
+    2. règles de la catégorie du vélo
+    3. règles générales
+    puis par séquence. Sans règle applicable, le tarif de base du vélo
+    est utilisé.
+
+    Les règles de portée "Location" s'appliquent au prix de la location,
+    celles de portée "Pénalités de retard" aux heures de retard uniquement :
+    les remises de durée ne réduisent donc jamais les pénalités.
+    """
+    _name = 'rental.pricing.rule'
+    _description = 'Règle de tarification des locations'
+    _order = 'sequence, id'
+
+    name = fields.Char(string="Nom", required=True)
+    active = fields.Boolean(default=True)
+    sequence = fields.Integer(string="Séquence", default=10)
+
+    applies_to = fields.Selection(
+        [
+            ('rental', 'Location'),
+            ('penalty', 'Pénalités de retard'),
+        ],
+        string="Portée",
+        required=True,
+        default='rental',
+        help="Location : prix de la période louée. "
+             "Pénalités de retard : prix des heures de retard (les paliers "
+             "comptent alors les unités de retard à partir de 1).",
+    )
+
+    billing_unit = fields.Selection(
+        [
+            ('hour', 'Par heure'),
+            ('day', 'Par jour'),
+        ],
+        string="Mode de facturation",
+        required=True,
+        default='day',
+    )
+
+    # Portée de la règle
+    bike_id = fields.Many2one(
+        'product.template',
+        string="Vélo",
+        ondelete='cascade',
+        help="Laisser vide pour appliquer la règle à tous les vélos",
+    )
+    categ_id = fields.Many2one(
+        'product.category',
+        string="Catégorie",
+        ondelete='cascade',
+        help="Laisser vide pour appliquer la règle à toutes les catégories",
+    )
+    partner_category_id = fields.Many2one(
+        'res.partner.category',
+        string="Groupe de clients",
+        ondelete='cascade',
+        help="Étiquette de contact des clients concernés (vide = tous les clients)",
+    )
+
+    # Conditions sur l'unité tarifée
+    day_type = fields.Selection(
+        [
+            ('all', 'Tous les jours'),
+            ('weekday', 'En semaine'),
+            ('weekend', 'Le week-end'),
+        ],
+        string="Jours",
+        required=True,
+        default='all',
+    )
+    date_start = fields.Date(string="Début de saison")
+    date_end = fields.Date(string="Fin de saison")
+    tier_min = fields.Integer(
+        string="À partir de l'unité",
+        default=1,
+        help="Première heure / premier jour de la location concerné (1 = dès le début)",
+    )
+    tier_max = fields.Integer(
+        string="Jusqu'à l'unité",
+        default=0,
+        help="Dernière heure / dernier jour concerné (0 = sans limite)",
+    )
+
+    # Prix
+    price_type = fields.Selection(
+        [
+            ('percent', 'Pourcentage du tarif de base'),
+            ('fixed', 'Prix fixe'),
+        ],
+        string="Type de prix",
+        required=True,
+        default='percent',
+    )
+    value = fields.Float(
+        string="Valeur",
+        required=True,
+        default=100.0,
+        help="Pourcentage du tarif de base du vélo (ex. 80 = -20 %) ou prix fixe par unité",
+    )
+
+    @api.constrains('tier_min', 'tier_max', 'date_start', 'date_end')
+    def _check_rule(self):
+        for rule in self:
+            if rule.tier_min < 1:
+                raise ValidationError("Le palier doit commencer à l'unité 1 au minimum.")
+            if rule.tier_max and rule.tier_max < rule.tier_min:
+                raise ValidationError("La fin du palier doit être après son début.")
+            if rule.date_start and rule.date_end and rule.date_end < rule.date_start:
+                raise ValidationError("La fin de saison doit être après son début.")
+
+    # =========================
+    #   INVALIDATION DU CACHE
+    # =========================
+    @api.model_create_multi
+    def create(self, vals_list):
+        rules = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return rules
+
+    def write(self, vals):
+        res = super().write(vals)
+        self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+    # =========================
+    #   COMPILATION DES RÈGLES
+    # =========================
+    @api.model
+    @tools.ormcache()
+    def _get_compiled_rules(self):
+        """
+        Compile les règles actives en un dictionnaire
+        {(applies_to, billing_unit, bike_id, categ_id): (CompiledRule, ...)}
+        où bike_id / categ_id valent 0 quand la règle ne les précise pas.
+
+        Le résultat est mis en cache jusqu'à la prochaine modification
+        d'une règle.
+        """
+        compiled = {}
+        for rule in self.sudo().search([]):
+            key = (
+                rule.applies_to, rule.billing_unit, rule.bike_id.id or 0, rule.categ_id.id or 0
+            )
+            compiled.setdefault(key, []).append(CompiledRule(
+                rule.partner_category_id.id or 0,
+                rule.day_type,
+                rule.date_start,
+                rule.date_end,
+                rule.tier_min,
+                rule.tier_max,
+                rule.price_type,
+                rule.value,
+            ))
+        return {key: tuple(rules) for key, rules in compiled.items()}
+
+    @api.model
+    def _candidate_rules(self, compiled, applies_to, billing_unit, bike_id, categ_id):
+        """Règles applicables à un vélo, de la plus spécifique à la plus générale."""
+        return (
+            compiled.get((applies_to, billing_unit, bike_id, categ_id), ())
+            + compiled.get((applies_to, billing_unit, bike_id, 0), ())
+            + compiled.get((applies_to, billing_unit, 0, categ_id), ())
+            + compiled.get((applies_to, billing_unit, 0, 0), ())
+        )
+
+    @api.model
+    def _get_pricing_tz(self):
+        """
+        Fuseau horaire des règles (jours de week-end, saisons) : celui de
+        la société, fixe, pour qu'un même contrat ait toujours le même prix
+        quel que soit l'utilisateur ou la tâche qui déclenche le calcul.
+        """
+        return pytz.timezone(self.env.company.partner_id.tz or 'UTC')
+
+    # =========================
+    #   ÉVALUATION
+    # =========================
+    @api.model
+    def _unit_price(self, rules, base_price, partner_categ_ids, unit_start, index):
+        """Prix d'une unité (heure ou jour) commençant à unit_start (heure locale)."""
+        day = unit_start.date()
+        is_weekend = unit_start.weekday() >= 5
+        for rule in rules:
+            if rule.partner_category_id and rule.partner_category_id not in partner_categ_ids:
+                continue
+            if rule.day_type == 'weekend' and not is_weekend:
+                continue
+            if rule.day_type == 'weekday' and is_weekend:
+                continue
+            if rule.date_start and day < rule.date_start:
+                continue
+            if rule.date_end and day > rule.date_end:
+                continue
+            if index < rule.tier_min or (rule.tier_max and index > rule.tier_max):
+                continue
+            if rule.price_type == 'fixed':
+                return rule.value
+            return base_price * rule.value / 100.0
+        return base_price
+
+    @api.model
+    def _price_period(self, rules, base_price, partner_categ_ids, start, units, unit_delta,
+                      tz=pytz.utc):
+        """
+        Prix d'une période de `units` unités (éventuellement fractionnaire)
+        commençant à `start` (heure locale de `tz`). Sans règle applicable,
+        le calcul est direct.
+        """
+        if units <= 0:
+            return 0.0
+        if not rules:
+            return base_price * units
+        total = 0.0
+        index = 1
+        unit_start = start
+        remaining = units
+        while remaining > 0:
+            weight = min(1.0, remaining)
+            total += weight * self._unit_price(
+                rules, base_price, partner_categ_ids, unit_start, index
+            )
+            remaining -= 1
+            index += 1
+            unit_start = tz.normalize(unit_start + unit_delta)
+        return total
+
+    @api.model
+    def _evaluate(self, contracts, late=False):
+        """
+        Calcule en lot le prix (ou la pénalité de retard) de contrats.
+
+        Les règles compilées sont lues une seule fois, et la liste des
+        règles candidates est partagée entre contrats du même vélo.
+
+        La pénalité de retard n'utilise que les règles de portée
+        "Pénalités de retard" ; sans règle, elle vaut le tarif de base
+        (prix horaire × heures de retard).
+
+        Returns:
+            dict: {contract.id: montant}
+        """
+        compiled = self._get_compiled_rules()
+        applies_to = 'penalty' if late else 'rental'
+        tz = self._get_pricing_tz()
+        candidates = {}
+        result = {}
+        for rec in contracts:
+            unit = rec.billing_unit or 'day'
+            key = (applies_to, unit, rec.bike_id.id or 0, rec.bike_id.categ_id.id or 0)
+            if key not in candidates:
+                candidates[key] = self._candidate_rules(compiled, *key)
+            rules = candidates[key]
+
+            if late:
+                units = rec.late_hours if unit == 'hour' else rec.late_hours / 24
+                start = rec.end_date
+            else:
+                units = rec.duration_hours if unit == 'hour' else rec.duration_days
+                start = rec.start_date
+
+            if not start or units <= 0:
+                result[rec.id] = 0.0
+                continue
+            result[rec.id] = self._price_period(
+                rules,
+                rec.unit_price,
+                set(rec.customer_id.category_id.ids) if rules else set(),
+                pytz.utc.localize(start).astimezone(tz),
+                units,
+                UNIT_DELTAS[unit],
+                tz,
+            )
+        return result
+
+    @api.model
+    def _compute_rental_prices(self, contracts):
+        """Prix de location de chaque contrat : {contract.id: prix}."""
+        return self._evaluate(contracts)
+
+    @api.model
+    def _compute_late_penalties(self, contracts):
+        """Pénalité de retard de chaque contrat : {contract.id: pénalité}."""
+        return self._evaluate(contracts.filtered(lambda c: c.is_late and c.late_hours > 0), late=True)
@@ -0,0 +1,2 @@
+from . import test_overdue_reminders
+from . import test_rental_pricing_rule
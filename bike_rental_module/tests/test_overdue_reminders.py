@@ -0,0 +1,123 @@
+"""
+Tests de la tâche de relance des locations en retard
+(rental.contract.cron_send_overdue_reminders).
+"""
+
+from datetime import datetime, timedelta
+
+from freezegun import freeze_time
+
+from odoo.tests import TransactionCase, tagged
+
+# Heure de référence des tests (UTC)
+NOW = datetime(2026, 6, 15, 12, 0)
+
+
+@tagged('post_install', '-at_install')
+class TestOverdueReminders(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Contract = cls.env['rental.contract']
+        cls.bike = cls.env['product.template'].create({
+            'name': "Vélo de test",
+            'rental_available': True,
+            'rental_price_hour': 5.0,
+            'rental_price_day': 30.0,
+        })
+        cls.customer = cls.env['res.partner'].create({
+            'name': "Client de test",
+            'email': 'client@example.com',
+            'tz': 'Europe/Paris',
+        })
+        # Curseurs éventuellement laissés par la tâche planifiée de la base
+        cls.env['rental.overdue.watermark'].search([]).unlink()
+
+    def _ongoing_contract(self, name, end_date, started_at=None):
+        """Contrat de 2 heures se terminant à end_date, démarré à son début (ou à started_at)."""
+        start_date = end_date - timedelta(hours=2)
+        with freeze_time(start_date - timedelta(hours=1)):
+            contract = self.Contract.create({
+                'name': name,
+                'bike_id': self.bike.id,
+                'customer_id': self.customer.id,
+                'start_date': start_date,
+                'end_date': end_date,
+                'billing_unit': 'hour',
+            })
+            contract.action_confirm()
+        with freeze_time(started_at or start_date):
+            contract.action_start()
+        return contract
+
+    def _run_cron(self, at):
+        with freeze_time(at):
+            self.Contract.cron_send_overdue_reminders()
+
+    def _mails(self, contract):
+        return self.env['mail.mail'].search([('subject', 'like', contract.name)])
+
+    def test_first_level_sent_once(self):
+        contract = self._ongoing_contract('LOC-T1', NOW - timedelta(hours=2))
+        self._run_cron(NOW)
+        self.assertEqual(contract.overdue_level, 1)
+        self.assertEqual(len(self._mails(contract)), 1)
+
+        self._run_cron(NOW + timedelta(minutes=15))
+        self.assertEqual(len(self._mails(contract)), 1, "Pas de seconde relance du même niveau")
+
+    def test_second_level_after_24_hours(self):
+        contract = self._ongoing_contract('LOC-T2', NOW - timedelta(hours=2))
+        self._run_cron(NOW)
+        self._run_cron(NOW + timedelta(hours=23))
+        self.assertEqual(contract.overdue_level, 2)
+        mails = self._mails(contract)
+        self.assertEqual(len(mails), 2)
+        self.assertTrue(any(mail.subject.startswith("Rappel") for mail in mails))
+
+    def test_only_highest_level_in_same_run(self):
+        contract = self._ongoing_contract('LOC-T3', NOW - timedelta(hours=23))
+        self._run_cron(NOW + timedelta(hours=7))
+        self.assertEqual(contract.overdue_level, 2)
+        mails = self._mails(contract)
+        self.assertEqual(len(mails), 1)
+        self.assertTrue(mails.subject.startswith("Rappel"))
+
+    def test_watermarks_stored_per_level(self):
+        self._run_cron(NOW)
+        watermarks = self.env['rental.overdue.watermark'].search([])
+        self.assertEqual(
+            {w.level: w.watermark for w in watermarks},
+            {1: NOW - timedelta(hours=1), 2: NOW - timedelta(hours=24)},
+        )
+        self.assertFalse(
+            self.env['ir.config_parameter'].get_param('bike_rental_module.overdue_watermark_1')
+        )
+
+    def test_late_start_behind_watermark_is_caught_up(self):
+        end_date = NOW - timedelta(hours=3)
+        # Curseur du niveau 1 déjà au-delà de la date de fin
+        self._run_cron(NOW)
+        contract = self._ongoing_contract('LOC-T4', end_date, started_at=NOW + timedelta(minutes=5))
+        self.assertTrue(contract.overdue_pending)
+
+        self._run_cron(NOW + timedelta(minutes=15))
+        self.assertEqual(contract.overdue_level, 1)
+        self.assertEqual(len(self._mails(contract)), 1)
+        self.assertFalse(contract.overdue_pending)
+
+    def test_late_fields_refreshed(self):
+        contract = self._ongoing_contract('LOC-T5', NOW - timedelta(hours=2))
+        self.assertFalse(contract.is_late)
+
+        self._run_cron(NOW)
+        self.assertTrue(contract.is_late)
+        self.assertAlmostEqual(contract.late_hours, 2.0)
+        self.assertAlmostEqual(contract.late_penalty, 10.0)
+
+    def test_due_date_in_customer_timezone(self):
+        contract = self._ongoing_contract('LOC-T6', NOW - timedelta(hours=2))
+        self._run_cron(NOW)
+        # 10:00 UTC = 12:00 à Paris (heure d'été)
+        self.assertIn("15/06/2026 12:00", self._mails(contract).body_html)
@@ -0,0 +1,170 @@
+"""
+Tests du calcul des prix et des pénalités avec les règles de tarification
+(rental.pricing.rule).
+"""
+
+from datetime import date, datetime, timedelta
+
+from freezegun import freeze_time
+
+from odoo.tests import TransactionCase, tagged
+
+# Date de création des contrats de test (UTC), avant toutes leurs périodes
+CREATED_AT = datetime(2026, 6, 1, 8, 0)
+
+
+@tagged('post_install', '-at_install')
+class TestRentalPricingRule(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Rule = cls.env['rental.pricing.rule']
+        # Règles éventuellement présentes dans la base : tarif de base seul
+        cls.Rule.search([]).write({'active': False})
+        cls.env.company.partner_id.tz = 'Europe/Paris'
+
+        cls.categ = cls.env['product.category'].create({'name': "Vélos de test"})
+        cls.bike = cls.env['product.template'].create({
+            'name': "Vélo de test",
+            'categ_id': cls.categ.id,
+            'rental_available': True,
+            'rental_price_hour': 5.0,
+            'rental_price_day': 30.0,
+        })
+        cls.customer = cls.env['res.partner'].create({'name': "Client de test"})
+
+    def _contract(self, start_date, end_date, billing_unit='day'):
+        with freeze_time(CREATED_AT):
+            return self.env['rental.contract'].create({
+                'bike_id': self.bike.id,
+                'customer_id': self.customer.id,
+                'start_date': start_date,
+                'end_date': end_date,
+                'billing_unit': billing_unit,
+            })
+
+    def _rule(self, **vals):
+        return self.Rule.create(dict({'name': "Règle de test"}, **vals))
+
+    def _returned_late(self, late, billing_unit):
+        """Contrat de 2 jours rendu avec `late` de retard."""
+        start_date = datetime(2026, 6, 10, 9, 0)
+        end_date = start_date + timedelta(days=2)
+        contract = self._contract(start_date, end_date, billing_unit)
+        with freeze_time(CREATED_AT):
+            contract.action_confirm()
+        with freeze_time(start_date):
+            contract.action_start()
+        with freeze_time(end_date + late):
+            contract.action_done()
+        return contract
+
+    # Sans règle : formules d'origine
+
+    def test_flat_rate_hour(self):
+        contract = self._contract(datetime(2026, 6, 10, 9, 0), datetime(2026, 6, 10, 14, 30), 'hour')
+        self.assertAlmostEqual(contract.price, contract.unit_price * contract.duration_hours)
+        self.assertAlmostEqual(contract.price, 27.5)
+
+    def test_flat_rate_day(self):
+        contract = self._contract(datetime(2026, 6, 10, 9, 0), datetime(2026, 6, 12, 21, 0))
+        self.assertAlmostEqual(contract.price, contract.unit_price * contract.duration_days)
+        self.assertAlmostEqual(contract.price, 75.0)
+
+    def test_flat_late_penalty_hour(self):
+        contract = self._returned_late(timedelta(hours=3), 'hour')
+        self.assertAlmostEqual(contract.late_hours, 3.0)
+        self.assertAlmostEqual(contract.late_penalty, contract.unit_price * contract.late_hours)
+
+    def test_flat_late_penalty_day(self):
+        contract = self._returned_late(timedelta(hours=36), 'day')
+        self.assertAlmostEqual(contract.late_penalty, contract.unit_price * contract.late_hours / 24)
+        self.assertAlmostEqual(contract.late_penalty, 45.0)
+
+    # Paliers de durée
+
+    def test_duration_tier(self):
+        """Jour 1 plein tarif, jours 2 à 7 à 80 %, plein tarif au-delà."""
+        self._rule(tier_min=2, tier_max=7, value=80.0)
+        start_date = datetime(2026, 6, 10, 9, 0)
+        contract = self._contract(start_date, start_date + timedelta(days=8))
+        self.assertAlmostEqual(contract.price, 30.0 + 6 * 24.0 + 30.0)
+
+    def test_tier_boundaries(self):
+        self._rule(tier_min=2, tier_max=7, value=80.0)
+        start_date = datetime(2026, 6, 10, 9, 0)
+        one_day = self._contract(start_date, start_date + timedelta(days=1))
+        self.assertAlmostEqual(one_day.price, 30.0)
+        seven_days = self._contract(start_date, start_date + timedelta(days=7))
+        self.assertAlmostEqual(seven_days.price, 30.0 + 6 * 24.0)
+
+    def test_partial_unit_weighted(self):
+        """La demi-journée finale est tarifée au prix de son palier, au prorata."""
+        self._rule(tier_min=2, tier_max=7, value=80.0)
+        start_date = datetime(2026, 6, 10, 9, 0)
+        contract = self._contract(start_date, start_date + timedelta(days=2, hours=12))
+        self.assertAlmostEqual(contract.price, 30.0 + 24.0 + 0.5 * 24.0)
+
+    # Week-end et saison, dans le fuseau horaire de la société
+
+    def test_weekend_in_company_timezone(self):
+        self._rule(billing_unit='hour', day_type='weekend', price_type='fixed', value=1.0)
+        # Vendredi 22:30 UTC = samedi 00:30 à Paris (heure d'été)
+        start_date = datetime(2026, 6, 19, 22, 30)
+        contract = self._contract(start_date, start_date + timedelta(hours=2), 'hour')
+        self.assertAlmostEqual(contract.price, 2.0)
+
+        # Vendredi 20:30 UTC = vendredi 22:30 à Paris, puis samedi 00:30
+        start_date = datetime(2026, 6, 19, 20, 30)
+        contract = self._contract(start_date, start_date + timedelta(hours=3), 'hour')
+        self.assertAlmostEqual(contract.price, 5.0 + 5.0 + 1.0)
+
+    def test_season(self):
+        self._rule(
+            price_type='fixed', value=20.0,
+            date_start=date(2026, 7, 1), date_end=date(2026, 7, 31),
+        )
+        # 30 juin 23:00 à Paris, puis 1er juillet 23:00
+        start_date = datetime(2026, 6, 30, 21, 0)
+        contract = self._contract(start_date, start_date + timedelta(days=2))
+        self.assertAlmostEqual(contract.price, 30.0 + 20.0)
+
+    # Priorité des règles
+
+    def test_bike_before_category_before_general(self):
+        general = self._rule(sequence=1, value=50.0)
+        categ_rule = self._rule(sequence=2, categ_id=self.categ.id, value=80.0)
+        bike_rule = self._rule(sequence=3, bike_id=self.bike.id, value=90.0)
+        start_date = datetime(2026, 6, 10, 9, 0)
+        end_date = start_date + timedelta(days=1)
+
+        self.assertAlmostEqual(self._contract(start_date, end_date).price, 27.0)
+        bike_rule.active = False
+        self.assertAlmostEqual(self._contract(start_date, end_date).price, 24.0)
+        categ_rule.active = False
+        self.assertAlmostEqual(self._contract(start_date, end_date).price, 15.0)
+        general.active = False
+        self.assertAlmostEqual(self._contract(start_date, end_date).price, 30.0)
+
+    def test_customer_group(self):
+        group = self.env['res.partner.category'].create({'name': "Clients fidèles"})
+        self._rule(partner_category_id=group.id, value=50.0)
+        start_date = datetime(2026, 6, 10, 9, 0)
+        end_date = start_date + timedelta(days=1)
+
+        self.assertAlmostEqual(self._contract(start_date, end_date).price, 30.0)
+        self.customer.category_id = group
+        self.assertAlmostEqual(self._contract(start_date, end_date).price, 15.0)
+
+    # Pénalités de retard
+
+    def test_rental_rules_do_not_reduce_penalties(self):
+        self._rule(billing_unit='hour', value=50.0)
+        contract = self._returned_late(timedelta(hours=3), 'hour')
+        self.assertAlmostEqual(contract.late_penalty, 15.0)
+
+    def test_penalty_rule(self):
+        self._rule(applies_to='penalty', billing_unit='hour', tier_min=3, value=200.0)
+        contract = self._returned_late(timedelta(hours=4), 'hour')
+        self.assertAlmostEqual(contract.late_penalty, 5.0 + 5.0 + 10.0 + 10.0)